@@ -8,7 +8,17 @@ import os
 from dotenv import load_dotenv
 import google.generativeai as genai
 import logging
-from typing import List, Dict, Any
+import threading
+import time
+from typing import List, Dict, Any, Optional
+from ratelimit import OUTBOUND_TIMEOUT, OutboundUnavailable, get_throttle, throttle_for_url
+from profiles import (
+    CompetitorProfileStore,
+    content_hash,
+    normalize_name,
+    normalize_url,
+    profile_store,
+)
 # Download necessary NLTK data
 nltk.download("vader_lexicon")
 
@@ -18,22 +28,46 @@ logger = logging.getLogger(__name__)
 
 
 class CompetitorAnalysis:
-    def __init__(self, serpapi_key: str, gemini_key: str):
+    def __init__(
+        self,
+        serpapi_key: str,
+        gemini_key: str,
+        profiles: CompetitorProfileStore = profile_store,
+    ):
         """
         Initialize the CompetitorAnalysis class with API keys and models.
         """
         self.serpapi_key = serpapi_key
         self.gemini_key = gemini_key
+        self.profiles = profiles
+        # Optional overrides to point SerpAPI and Gemini at local stand-ins
+        self.serpapi_endpoint = os.getenv("SERPAPI_ENDPOINT")
+        self.gemini_endpoint = os.getenv("GEMINI_ENDPOINT")
         self.sia = SentimentIntensityAnalyzer()
         self.summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+        # The analyzer is shared across threadpool requests, and a fast
+        # tokenizer cannot be used from two threads at once
+        self._summarizer_lock = threading.Lock()
 
         # Configure Gemini
-        genai.configure(api_key=self.gemini_key)
+        if self.gemini_endpoint:
+            genai.configure(
+                api_key=self.gemini_key,
+                transport="rest",
+                client_options={"api_endpoint": self.gemini_endpoint},
+            )
+        else:
+            genai.configure(api_key=self.gemini_key)
         self.gemini_model = genai.GenerativeModel("gemini-pro")
 
-    def search_competitors(self, query: str, num_results: int = 5) -> List[str]:
+    def search_competitors(
+        self, query: str, num_results: int = 5, deadline: float = None
+    ) -> List[str]:
         """
         Search for competitors using SerpAPI with a more specific query.
+
+        `deadline` is a time.monotonic() value after which the search is
+        refused with OutboundUnavailable instead of waiting for a slot.
         """
         try:
             # Create a focused search query
@@ -45,11 +79,11 @@ class CompetitorAnalysis:
                 "api_key": self.serpapi_key,
                 "num": num_results,
             }
-            search = GoogleSearch(params)
-            results = search.get_dict()
+            results = self._google_search(params, deadline)
 
             # Filter out irrelevant results (e.g., articles, guides)
             competitors = []
+            seen = set()
             for result in results.get("organic_results", []):
                 title = result.get("title", "").lower()
                 snippet = result.get("snippet", "").lower()
@@ -59,15 +93,62 @@ class CompetitorAnalysis:
                     for x in ["how to", "guide", "tutorial", "list of", "article"]
                 ):
                     continue
-                competitors.append(result["title"])
+                # Collapse titles we already know point at the same website and
+                # reuse the name we hold that profile under
+                profile = self.profiles.get(result["title"])
+                if profile:
+                    key = normalize_url(profile["website"])
+                else:
+                    key = normalize_name(result["title"])
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                competitors.append(profile["name"] if profile else result["title"])
 
             return competitors[:num_results]
 
+        except OutboundUnavailable:
+            # Let the endpoint answer 503 instead of an empty competitor list
+            raise
+
         except Exception as e:
             logger.error(f"Error searching for competitors: {str(e)}")
             return []
 
-    def scrape_website(self, url: str) -> str:
+    def _google_search(self, params: Dict[str, Any], deadline: float = None) -> Dict[str, Any]:
+        """
+        Run a SerpAPI search through the shared SerpAPI rate limiter.
+        """
+        throttle = get_throttle("serpapi")
+        throttle.acquire(deadline)
+        try:
+            # Go through get_response rather than get_dict so the HTTP status
+            # and Retry-After reach the limiter
+            search = GoogleSearch({**params, "output": "json"})
+            search.timeout = OUTBOUND_TIMEOUT
+            if self.serpapi_endpoint:
+                search.BACKEND = self.serpapi_endpoint
+            response = search.get_response()
+        except Exception:
+            throttle.record_failure()
+            raise
+
+        throttle.record_status(response.status_code, response.headers.get("Retry-After"))
+        try:
+            results = response.json()
+        except ValueError:
+            results = {"error": response.text[:200]}
+
+        if not response.ok:
+            logger.error(f"SerpAPI error ({response.status_code}): {results.get('error')}")
+        elif "error" in results and "search_metadata" not in results:
+            # Account-level problems (quota, bad key) can also come back as a
+            # 200 with a bare "error"; an empty search still has metadata.
+            logger.error(f"SerpAPI error: {results['error']}")
+            throttle.record_failure()
+        return results
+
+    def scrape_website(self, url: str, deadline: float = None) -> str:
         """
         Scrape the content of a website.
         """
@@ -75,7 +156,20 @@ class CompetitorAnalysis:
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
             }
-            response = requests.get(url, headers=headers, timeout=10)
+            throttle = throttle_for_url(url)
+            throttle.acquire(deadline)
+            try:
+                response = requests.get(url, headers=headers, timeout=OUTBOUND_TIMEOUT)
+            except requests.RequestException:
+                throttle.record_failure()
+                raise
+            throttle.record_status(
+                response.status_code, response.headers.get("Retry-After")
+            )
+            if not response.ok:
+                # Error and bot-block pages must not be summarized or cached
+                logger.error(f"Error scraping website {url}: HTTP {response.status_code}")
+                return ""
             soup = BeautifulSoup(response.content, "html.parser")
 
             # Remove scripts and styles
@@ -86,6 +180,10 @@ class CompetitorAnalysis:
             website_content = " ".join(soup.stripped_strings)
             return website_content[:5000]  # Limit content length
 
+        except OutboundUnavailable as e:
+            logger.warning(f"Skipping website {url}: {str(e)}")
+            return ""
+
         except Exception as e:
             logger.error(f"Error scraping website {url}: {str(e)}")
             return ""
@@ -101,50 +199,49 @@ class CompetitorAnalysis:
         Summarize the given text using the BART model.
         """
         try:
-            return self.summarizer(
-                text, max_length=max_length, min_length=50, do_sample=False
-            )[0]["summary_text"]
+            with self._summarizer_lock:
+                return self.summarizer(
+                    text, max_length=max_length, min_length=50, do_sample=False
+                )[0]["summary_text"]
         except Exception as e:
             logger.error(f"Error summarizing text: {str(e)}")
             return text[:max_length] + "..."
 
-    def analyze_competitor(self, competitor_name: str) -> Dict[str, Any]:
+    def analyze_competitor(self, competitor_name: str, deadline: float = None) -> Dict[str, Any]:
         """
         Analyze a competitor by scraping their website and performing sentiment analysis.
+
+        Results are kept in the profile store; the summary is only recomputed
+        when the scraped content has changed since the last analysis. No
+        outbound call waits past `deadline` (a time.monotonic() value).
         """
         try:
-            # Search for the competitor's website
-            params = {
-                "engine": "google",
-                "q": f"{competitor_name} app official website",
-                "api_key": self.serpapi_key,
-                "num": 1,
-            }
-            search = GoogleSearch(params)
-            results = search.get_dict()
+            profile = self.profiles.get(competitor_name)
+            if profile and self.profiles.is_fresh(profile):
+                return self._profile_result(competitor_name, profile)
 
-            # Get the website URL from the first organic result
-            organic_results = results.get("organic_results", [])
-            if not organic_results:
-                return {
-                    "name": competitor_name,
-                    "sentiment": {"neg": 0, "neu": 1, "pos": 0, "compound": 0},
-                    "summary": "No website found",
-                }
+            in_flight = self.profiles.claim_refresh(competitor_name)
+            if in_flight is not None:
+                # Another request is already refreshing this competitor: serve
+                # the stale profile, or wait for the first analysis to land
+                if profile is None:
+                    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    in_flight.wait(timeout)
+                    profile = self.profiles.get(competitor_name)
+                if profile:
+                    return self._profile_result(competitor_name, profile)
+                return self._unavailable_result(competitor_name)
 
-            website_url = organic_results[0].get("link")
+            try:
+                return self._refresh_profile(competitor_name, profile, deadline)
+            finally:
+                self.profiles.finish_refresh(competitor_name)
 
-            # Scrape and analyze the website content
-            website_content = self.scrape_website(website_url)
-            sentiment = self.analyze_sentiment(website_content)
-            summary = self.summarize_text(website_content)
-
-            return {
-                "name": competitor_name,
-                "website": website_url,
-                "sentiment": sentiment,
-                "summary": summary,
-            }
+        except OutboundUnavailable as e:
+            # Our own limiter refused the lookup; this says nothing about the
+            # competitor, so keep it out of summaries and the Gemini prompt
+            logger.warning(f"Skipping analysis of {competitor_name}: {str(e)}")
+            return self._unavailable_result(competitor_name)
 
         except Exception as e:
             logger.error(f"Error analyzing competitor {competitor_name}: {str(e)}")
@@ -154,6 +251,87 @@ class CompetitorAnalysis:
                 "summary": f"Error analyzing competitor: {str(e)}",
             }
 
+    def _refresh_profile(
+        self, competitor_name: str, profile: Optional[Dict[str, Any]], deadline: float
+    ) -> Dict[str, Any]:
+        """
+        Re-scrape a competitor and only re-summarize if its content changed.
+        """
+        if profile:
+            website_url = profile["website"]
+        else:
+            website_url = self._find_website(competitor_name, deadline)
+            if not website_url:
+                return {
+                    "name": competitor_name,
+                    "sentiment": {"neg": 0, "neu": 1, "pos": 0, "compound": 0},
+                    "summary": "No website found",
+                }
+
+            # Another name may already point at the same website
+            profile = self.profiles.get_by_url(website_url)
+            if profile:
+                self.profiles.alias(competitor_name, profile)
+                if self.profiles.is_fresh(profile):
+                    return self._profile_result(competitor_name, profile)
+
+        # Scrape and analyze the website content
+        website_content = self.scrape_website(website_url, deadline)
+        if not website_content and profile:
+            # Keep serving the last good analysis while the site is unreachable
+            return self._profile_result(competitor_name, profile)
+
+        digest = content_hash(website_content)
+        if profile and profile["content_hash"] == digest:
+            self.profiles.touch(profile)
+            return self._profile_result(competitor_name, profile)
+
+        sentiment = self.analyze_sentiment(website_content)
+        summary = self.summarize_text(website_content)
+        if website_content:
+            self.profiles.put(competitor_name, website_url, digest, sentiment, summary)
+
+        return {
+            "name": competitor_name,
+            "website": website_url,
+            "sentiment": sentiment,
+            "summary": summary,
+        }
+
+    def _unavailable_result(self, competitor_name: str) -> Dict[str, Any]:
+        return {
+            "name": competitor_name,
+            "sentiment": {"neg": 0, "neu": 1, "pos": 0, "compound": 0},
+            "summary": "Analysis unavailable",
+            "unavailable": True,
+        }
+
+    def _find_website(self, competitor_name: str, deadline: float = None) -> str:
+        """
+        Look up a competitor's website URL with SerpAPI.
+        """
+        params = {
+            "engine": "google",
+            "q": f"{competitor_name} app official website",
+            "api_key": self.serpapi_key,
+            "num": 1,
+        }
+        results = self._google_search(params, deadline)
+
+        # Get the website URL from the first organic result
+        organic_results = results.get("organic_results", [])
+        if not organic_results:
+            return ""
+        return organic_results[0].get("link", "")
+
+    def _profile_result(self, competitor_name: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "name": competitor_name,
+            "website": profile["website"],
+            "sentiment": profile["sentiment"],
+            "summary": profile["summary"],
+        }
+
     def suggest_differentiation(self, competitors_data: List[Dict[str, Any]]) -> str:
         """
         Generate suggestions for differentiating the app idea based on competitor analysis.
@@ -162,6 +340,10 @@ class CompetitorAnalysis:
         negative_aspects = []
 
         for competitor in competitors_data:
+            # Prefer the stored profile so callers only need to pass names
+            profile = self.profiles.get(competitor["name"])
+            if profile:
+                competitor = self._profile_result(competitor["name"], profile)
             if competitor["sentiment"]["compound"] > 0.2:
                 positive_aspects.append(
                     f"{competitor['name']} is viewed positively for: {competitor['summary']}"
@@ -187,7 +369,11 @@ class CompetitorAnalysis:
         try:
             # Prepare the input for Gemini
             competitor_summaries = "\n".join(
-                [f"{comp['name']}: {comp['summary']}" for comp in competitors_data]
+                [
+                    f"{comp['name']}: {comp['summary']}"
+                    for comp in competitors_data
+                    if not comp.get("unavailable")
+                ]
             )
             prompt = f"""
             Analyze the feasibility of the following app idea:
@@ -205,7 +391,11 @@ class CompetitorAnalysis:
             """
 
             # Generate the feasibility report using Gemini
-            response = self.gemini_model.generate_content(prompt)
+            # Generating a full report legitimately takes longer than a
+            # lookup, but it must still give up well before the client does
+            response = self.gemini_model.generate_content(
+                prompt, request_options={"timeout": OUTBOUND_TIMEOUT * 6}
+            )
             return response.text
 
         except Exception as e:
@@ -0,0 +1,620 @@
+"""
+Load-testing harness for the FastAPI app in main.py.
+
+Starts the real app in a subprocess with Google CSE, SerpAPI, Gemini and the
+scraped websites replaced by local stand-ins, then ramps up concurrency on
+/findMentors and /findCompetitors and reports throughput, latency
+percentiles, event-loop lag, CPU and RSS for each step.
+
+    python loadtest.py --concurrency 1,2,4,8,16 --duration 30 \\
+        --latency cse=0.3,serpapi=0.5,gemini=2,site=0.2 --errors site=0.05
+
+The outbound limits under test come from the usual RATE_LIMIT_<PROVIDER> and
+MAX_CONCURRENT_* environment variables, which are passed through to the app.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+UPSTREAMS = ["cse", "serpapi", "gemini", "site"]
+
+# Host the LinkedIn stand-in is reached under; the app maps it to the
+# "linkedin" provider limit like linkedin.com in production.
+LINKEDIN_HOST = "localhost"
+
+ENDPOINTS = {
+    "findMentors": "/findMentors",
+    "findCompetitors": "/findCompetitors",
+}
+
+IDEAS = [
+    "meal planning",
+    "personal finance",
+    "language learning",
+    "pet care",
+    "home workout",
+    "team note taking",
+    "habit tracking",
+    "travel itinerary",
+]
+
+COMPETITORS = [
+    "Notion", "Todoist", "Evernote", "Trello", "Asana", "Mealime", "Yummly",
+    "Mint", "YNAB", "Duolingo", "Babbel", "Rover", "Wag", "Fitbod", "Strava",
+    "Habitica", "Streaks", "TripIt", "Wanderlog", "Obsidian",
+]
+
+LOREM = (
+    "{name} helps people organize their day with a clean and friendly design. "
+    "Users love the fast sync across devices and the thoughtful reminders. "
+    "Some reviewers mention that advanced features sit behind a subscription "
+    "and that onboarding can feel slow for new teams. "
+)
+
+
+def parse_upstream_values(value: str) -> Dict[str, float]:
+    """
+    Parse "cse=0.2,site=0.1" into a dict, rejecting unknown upstream names.
+    """
+    values = {name: 0.0 for name in UPSTREAMS}
+    if not value:
+        return values
+    for item in value.split(","):
+        name, _, number = item.partition("=")
+        if name not in values:
+            raise argparse.ArgumentTypeError(
+                f"Unknown upstream {name!r}, expected one of {', '.join(UPSTREAMS)}"
+            )
+        values[name] = float(number)
+    return values
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile; returns 0.0 for an empty sample.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class StandIns:
+    def __init__(
+        self,
+        latency: Dict[str, float],
+        errors: Dict[str, float],
+        throttled: Dict[str, float],
+    ):
+        """
+        One local HTTP server impersonating every upstream the app talks to.
+
+        Each upstream sleeps for roughly `latency[name]` seconds (+/- 20%),
+        then fails with a 500 with probability `errors[name]` or a 429 with
+        Retry-After with probability `throttled[name]`.
+        """
+        self.latency = latency
+        self.errors = errors
+        self.throttled = throttled
+        self.calls: Counter = Counter()
+        self.base_url = ""
+        # Same server under another host name, so the app puts profile
+        # previews in the LinkedIn bucket rather than the stand-in site bucket
+        self.linkedin_url = ""
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get("/customsearch/v1", self._custom_search)
+        app.router.add_get("/search", self._serpapi)
+        app.router.add_post("/{version}/models/{model}:generateContent", self._gemini)
+        app.router.add_get("/linkedin.com/in/{slug}", self._linkedin_profile)
+        app.router.add_get("/site/{slug}", self._website)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{port}"
+        self.linkedin_url = f"http://{LINKEDIN_HOST}:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _simulate(self, upstream: str) -> Optional[web.Response]:
+        """
+        Apply the configured latency and return an error response if one is due.
+        """
+        self.calls[upstream] += 1
+        delay = self.latency[upstream]
+        if delay > 0:
+            await asyncio.sleep(random.uniform(0.8 * delay, 1.2 * delay))
+        roll = random.random()
+        if roll < self.throttled[upstream]:
+            self.calls[f"{upstream}_429"] += 1
+            return web.json_response(
+                {"error": "rate limited"}, status=429, headers={"Retry-After": "1"}
+            )
+        if roll < self.throttled[upstream] + self.errors[upstream]:
+            self.calls[f"{upstream}_500"] += 1
+            return web.json_response({"error": "injected failure"}, status=500)
+        return None
+
+    async def _custom_search(self, request: web.Request) -> web.Response:
+        error = await self._simulate("cse")
+        if error:
+            return error
+        query = request.query.get("q", "")
+        seed = int(hashlib.md5(query.encode()).hexdigest(), 16)
+        items = []
+        for i in range(10):
+            slug = f"mentor-{(seed + i) % 50}"
+            items.append({
+                "title": f"Mentor {(seed + i) % 50} - Founder & CEO",
+                "snippet": (
+                    f"Founder and mentor with {(seed + i) % 15 + 2} years of "
+                    "experience. Expert in growth."
+                ),
+                "link": f"{self.linkedin_url}/linkedin.com/in/{slug}",
+            })
+        return web.json_response({"items": items})
+
+    async def _linkedin_profile(self, request: web.Request) -> web.Response:
+        error = await self._simulate("site")
+        if error:
+            return error
+        slug = request.match_info["slug"]
+        html = (
+            f"<html><head><title>{slug} | Founder | LinkedIn</title></head><body>"
+            f"<section id='about'>Founder and mentor. Experienced in scaling early teams.</section>"
+            f"<section id='experience'>Founder 2015 - 2024. Advisor 2012 - 2015.</section>"
+            f"</body></html>"
+        )
+        return web.Response(text=html, content_type="text/html")
+
+    async def _serpapi(self, request: web.Request) -> web.Response:
+        error = await self._simulate("serpapi")
+        if error:
+            return error
+        query = request.query.get("q", "")
+        if "official website" in query:
+            name = query.replace(" app official website", "")
+            slug = name.lower().replace(" ", "-")
+            results = [{"title": name, "link": f"{self.base_url}/site/{slug}"}]
+        else:
+            seed = int(hashlib.md5(query.encode()).hexdigest(), 16)
+            num = int(request.query.get("num", 5))
+            names = [COMPETITORS[(seed + i) % len(COMPETITORS)] for i in range(num)]
+            results = [
+                {"title": f"{name} - Plan smarter", "snippet": f"{name} is a popular choice."}
+                for name in names
+            ]
+        return web.json_response({
+            "search_metadata": {"status": "Success"},
+            "organic_results": results,
+        })
+
+    async def _website(self, request: web.Request) -> web.Response:
+        error = await self._simulate("site")
+        if error:
+            return error
+        name = request.match_info["slug"].replace("-", " ").title()
+        body = "".join(f"<p>{LOREM.format(name=name)}</p>" for _ in range(6))
+        html = f"<html><head><title>{name}</title></head><body>{body}</body></html>"
+        return web.Response(text=html, content_type="text/html")
+
+    async def _gemini(self, request: web.Request) -> web.Response:
+        error = await self._simulate("gemini")
+        if error:
+            return error
+        text = (
+            "1. Market demand: moderate.\n2. Competition level: high.\n"
+            "3. Potential challenges: retention.\n4. Opportunities: niche focus.\n"
+            "5. Recommendations: start small and iterate."
+        )
+        return web.json_response({
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+        })
+
+
+def current_rss() -> int:
+    """
+    Resident set size in bytes, falling back to peak RSS off Linux and 0 where
+    neither is available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return 0
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def serve(port: int, site_rate: float, site_burst: int) -> None:
+    """
+    Run main.app with a stats route for the harness. Called in the subprocess.
+    """
+    import uvicorn
+    import ratelimit
+    from main import app
+
+    # Every stand-in website shares the harness host, so give that host one
+    # combined budget instead of the per-site default.
+    ratelimit.PROVIDER_LIMITS["127.0.0.1"] = (site_rate, site_burst)
+    ratelimit.PROVIDER_HOSTS[LINKEDIN_HOST] = "linkedin"
+
+    lag_samples: deque = deque(maxlen=100000)
+    monitor: Dict[str, Any] = {}
+
+    async def measure_lag(interval: float = 0.05) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag_samples.append(time.perf_counter() - started - interval)
+
+    @app.get("/__loadtest/stats", include_in_schema=False)
+    async def loadtest_stats(reset: bool = False) -> Dict[str, Any]:
+        if "task" not in monitor:
+            monitor["task"] = asyncio.get_running_loop().create_task(measure_lag())
+        samples = list(lag_samples)
+        if reset:
+            lag_samples.clear()
+        return {
+            "cpu_seconds": time.process_time(),
+            "rss_bytes": current_rss(),
+            "loop_lag_p50": percentile(samples, 50),
+            "loop_lag_p99": percentile(samples, 99),
+            "loop_lag_max": max(samples) if samples else 0.0,
+        }
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.stand_ins = StandIns(args.latency, args.errors, args.throttled)
+        self.app_url = f"http://127.0.0.1:{args.port}"
+        self.process: Optional[subprocess.Popen] = None
+
+    async def run(self) -> List[Dict[str, Any]]:
+        base_url = await self.stand_ins.start()
+        logger.info(f"Stand-ins listening on {base_url}")
+        try:
+            self._start_app(base_url)
+            async with aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.args.timeout),
+                connector=aiohttp.TCPConnector(limit=0),
+            ) as session:
+                await self._wait_until_ready(session)
+                results = []
+                for endpoint in self.args.endpoints:
+                    results.extend(await self._ramp(session, endpoint))
+                return results
+        finally:
+            self._stop_app()
+            await self.stand_ins.stop()
+
+    def _start_app(self, base_url: str) -> None:
+        env = dict(os.environ)
+        env.update({
+            "GOOGLE_API_KEY": "loadtest",
+            "GOOGLE_CSE_ID": "loadtest",
+            "SERPAPI_API_KEY": "loadtest",
+            "GEMINI_API_KEY": "loadtest",
+            "GOOGLE_CSE_ENDPOINT": f"{base_url}/",
+            "SERPAPI_ENDPOINT": base_url,
+            "GEMINI_ENDPOINT": base_url,
+        })
+        command = [
+            sys.executable, os.path.abspath(__file__), "serve",
+            "--port", str(self.args.port),
+            "--site-rate", str(self.args.site_rate),
+            "--site-burst", str(self.args.site_burst),
+        ]
+        self.process = subprocess.Popen(
+            command, env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+
+    def _stop_app(self) -> None:
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    async def _wait_until_ready(self, session: aiohttp.ClientSession) -> None:
+        """
+        Poll the app until it answers; model imports can take a while.
+        """
+        deadline = time.monotonic() + self.args.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"App exited during startup with code {self.process.returncode}")
+            try:
+                async with session.get(f"{self.app_url}/") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+        raise RuntimeError("App did not become ready in time")
+
+    async def _stats(self, session: aiohttp.ClientSession, reset: bool) -> Dict[str, Any]:
+        params = {"reset": "true" if reset else "false"}
+        async with session.get(f"{self.app_url}/__loadtest/stats", params=params) as response:
+            return await response.json()
+
+    async def _ramp(self, session: aiohttp.ClientSession, endpoint: str) -> List[Dict[str, Any]]:
+        """
+        Run each concurrency step for one endpoint, stopping once the SLO breaks.
+        """
+        results = []
+        for concurrency in self.args.concurrency:
+            result = await self._step(session, endpoint, concurrency)
+            results.append(result)
+            print_step(result)
+            if result["p99"] > self.args.slo_p99 * self.args.stop_factor:
+                logger.info(f"{endpoint}: p99 far beyond SLO, stopping ramp")
+                break
+        return results
+
+    async def _step(self, session: aiohttp.ClientSession, endpoint: str, concurrency: int) -> Dict[str, Any]:
+        """
+        Closed-loop load: `concurrency` workers issue requests back to back.
+
+        Percentiles cover every request, shed and failed ones included, so
+        fast 503s cannot hide slow successes; ok_p* cover 200s only.
+        """
+        latencies: List[float] = []
+        ok_latencies: List[float] = []
+        statuses: Counter = Counter()
+        path = ENDPOINTS[endpoint]
+        ideas = IDEAS[: self.args.distinct_ideas]
+        stop_at = time.monotonic() + self.args.duration
+
+        async def worker(worker_id: int) -> None:
+            sent = 0
+            while time.monotonic() < stop_at:
+                params = {"business_idea": ideas[(worker_id + sent) % len(ideas)]}
+                sent += 1
+                started = time.perf_counter()
+                try:
+                    async with session.get(f"{self.app_url}{path}", params=params) as response:
+                        await response.read()
+                        status = response.status
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    status = 0
+                elapsed = time.perf_counter() - started
+                statuses[status] += 1
+                latencies.append(elapsed)
+                if status == 200:
+                    ok_latencies.append(elapsed)
+                elif status == 503:
+                    # Shed requests tell us to back off; honor that like a client would
+                    await asyncio.sleep(min(1.0, max(0.0, stop_at - time.monotonic())))
+
+        before = await self._stats(session, reset=True)
+        started = time.monotonic()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        wall = time.monotonic() - started
+        after = await self._stats(session, reset=True)
+
+        total = sum(statuses.values())
+        return {
+            "endpoint": endpoint,
+            "concurrency": concurrency,
+            "requests": total,
+            "ok": statuses[200],
+            "shed": statuses[503],
+            "errors": total - statuses[200] - statuses[503],
+            "throughput": statuses[200] / wall,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "ok_p50": percentile(ok_latencies, 50),
+            "ok_p99": percentile(ok_latencies, 99),
+            "loop_lag_p99": after["loop_lag_p99"],
+            "loop_lag_max": after["loop_lag_max"],
+            "cpu_percent": 100 * (after["cpu_seconds"] - before["cpu_seconds"]) / wall,
+            "rss_mb": after["rss_bytes"] / 2 ** 20,
+            "statuses": dict(statuses),
+        }
+
+
+STEP_HEADER = (
+    f"{'endpoint':<16}{'conc':>5}{'reqs':>7}{'ok':>6}{'shed':>6}{'err':>6}"
+    f"{'rps':>8}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'okp99 s':>8}{'lag99ms':>8}{'cpu%':>7}{'rssMB':>8}"
+)
+
+
+def print_step(result: Dict[str, Any]) -> None:
+    print(
+        f"{result['endpoint']:<16}{result['concurrency']:>5}{result['requests']:>7}"
+        f"{result['ok']:>6}{result['shed']:>6}{result['errors']:>6}"
+        f"{result['throughput']:>8.2f}{result['p50']:>8.2f}{result['p95']:>8.2f}"
+        f"{result['p99']:>8.2f}{result['ok_p99']:>8.2f}{result['loop_lag_p99'] * 1000:>8.1f}"
+        f"{result['cpu_percent']:>7.0f}{result['rss_mb']:>8.0f}",
+        flush=True,
+    )
+
+
+def capacity(results: List[Dict[str, Any]], slo_p99: float, max_error_rate: float) -> Dict[str, Any]:
+    """
+    Highest-throughput step per endpoint that met the p99 and error-rate SLO.
+    """
+    report = {}
+    for result in results:
+        failed = result["requests"] - result["ok"]
+        error_rate = failed / result["requests"] if result["requests"] else 1.0
+        if result["ok"] and result["p99"] <= slo_p99 and error_rate <= max_error_rate:
+            best = report.get(result["endpoint"])
+            if best is None or result["throughput"] > best["throughput"]:
+                report[result["endpoint"]] = result
+    return report
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    sub = parser.add_subparsers(dest="command")
+
+    serve_parser = sub.add_parser("serve", help=argparse.SUPPRESS)
+    serve_parser.add_argument("--port", type=int, required=True)
+    serve_parser.add_argument("--site-rate", type=float, required=True)
+    serve_parser.add_argument("--site-burst", type=int, required=True)
+
+    parser.add_argument(
+        "--endpoints",
+        type=lambda value: value.split(","),
+        default=list(ENDPOINTS),
+        help="Comma-separated endpoints to test (default: all)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=lambda value: [int(step) for step in value.split(",")],
+        default=[1, 2, 4, 8, 16, 32],
+        help="Comma-separated concurrency steps to ramp through",
+    )
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per step")
+    parser.add_argument(
+        "--timeout", type=float, default=120.0, help="Per-request client timeout in seconds"
+    )
+    parser.add_argument(
+        "--latency",
+        type=parse_upstream_values,
+        default=parse_upstream_values("cse=0.2,serpapi=0.3,gemini=1.0,site=0.1"),
+        help="Mean stand-in latency in seconds, e.g. cse=0.2,site=0.1",
+    )
+    parser.add_argument(
+        "--errors",
+        type=parse_upstream_values,
+        default=parse_upstream_values(""),
+        help="Fraction of stand-in responses that fail with 500, e.g. gemini=0.05",
+    )
+    parser.add_argument(
+        "--throttled",
+        type=parse_upstream_values,
+        default=parse_upstream_values(""),
+        help="Fraction of stand-in responses that fail with 429 and Retry-After",
+    )
+    parser.add_argument(
+        "--site-rate",
+        type=float,
+        default=50.0,
+        help="Outbound requests per second allowed to the shared stand-in website host",
+    )
+    parser.add_argument("--site-burst", type=int, default=50)
+    parser.add_argument(
+        "--distinct-ideas",
+        type=int,
+        default=len(IDEAS),
+        help="Number of distinct business ideas to cycle through",
+    )
+    parser.add_argument("--slo-p99", type=float, default=10.0, help="p99 latency SLO in seconds")
+    parser.add_argument(
+        "--max-error-rate",
+        type=float,
+        default=0.01,
+        help="Highest fraction of failed or shed requests that still meets the SLO",
+    )
+    parser.add_argument(
+        "--stop-factor",
+        type=float,
+        default=3.0,
+        help="Stop ramping once p99 exceeds this multiple of the SLO",
+    )
+    parser.add_argument(
+        "--startup-timeout",
+        type=float,
+        default=600.0,
+        help="Seconds to wait for the app to load its models and start",
+    )
+    parser.add_argument("--port", type=int, default=8765, help="Port for the app under test")
+    parser.add_argument("--json", dest="json_path", help="Also write the full report to this file")
+
+    args = parser.parse_args(argv)
+    if args.command != "serve":
+        unknown = [name for name in args.endpoints if name not in ENDPOINTS]
+        if unknown:
+            parser.error(f"Unknown endpoints: {', '.join(unknown)}")
+        args.distinct_ideas = max(1, min(args.distinct_ideas, len(IDEAS)))
+    return args
+
+
+def main(argv: List[str]) -> None:
+    args = parse_args(argv)
+    if args.command == "serve":
+        serve(args.port, args.site_rate, args.site_burst)
+        return
+
+    load_test = LoadTest(args)
+    print(STEP_HEADER, flush=True)
+    results = asyncio.run(load_test.run())
+
+    print(f"\nCapacity at p99 <= {args.slo_p99:.1f}s and error rate <= {args.max_error_rate:.0%}:")
+    best = capacity(results, args.slo_p99, args.max_error_rate)
+    for endpoint in args.endpoints:
+        if endpoint in best:
+            step = best[endpoint]
+            print(f"  {endpoint}: {step['throughput']:.2f} req/s at concurrency {step['concurrency']}")
+        else:
+            print(f"  {endpoint}: no step met the SLO")
+    print(f"Stand-in calls: {dict(load_test.stand_ins.calls)}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({
+                "config": {
+                    "latency": args.latency,
+                    "errors": args.errors,
+                    "throttled": args.throttled,
+                    "slo_p99": args.slo_p99,
+                    "site_rate": args.site_rate,
+                },
+                "steps": results,
+                "capacity": {
+                    name: {
+                        "throughput": step["throughput"],
+                        "concurrency": step["concurrency"],
+                    }
+                    for name, step in best.items()
+                },
+                "stand_in_calls": dict(load_test.stand_ins.calls),
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,9 +1,13 @@
 from typing import Union, List, Dict, Any
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import asyncio
+import threading
+import time
 from networking import MentorFinder
 from competitor import CompetitorAnalysis
+from ratelimit import AdmissionController, OutboundUnavailable, Overloaded, retry_after_header
 from dotenv import load_dotenv
 import os
 
@@ -16,6 +20,62 @@ load_dotenv()
 serpapi_key = os.getenv("SERPAPI_API_KEY")
 gemini_key = os.getenv("GEMINI_API_KEY")
 
+# Upper bound in seconds on how long one request waits for outbound rate
+# limit slots; past it, searches are refused and the request finishes with
+# what it has instead of queueing behind the provider budget.
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "30"))
+
+# One analyzer for the whole process: it holds the ~1.6 GB BART pipeline and
+# configures the global Gemini client, so it must not be built per request
+# now that /findCompetitors requests run concurrently.
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+def get_analyzer() -> CompetitorAnalysis:
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            _analyzer = CompetitorAnalysis(serpapi_key, gemini_key)
+        return _analyzer
+
+# Bound concurrent work per endpoint so a burst is shed with 503 + Retry-After
+# instead of queueing behind slow upstream APIs. Registered before CORS so the
+# CORS middleware still wraps the 503 responses.
+admission = {
+    "/findMentors": AdmissionController(
+        "findMentors",
+        max_concurrent=int(os.getenv("MAX_CONCURRENT_MENTOR_REQUESTS", "8")),
+        max_waiting=16,
+        max_queue_wait=5.0,
+        providers=["google_cse"],
+    ),
+    "/findCompetitors": AdmissionController(
+        "findCompetitors",
+        max_concurrent=int(os.getenv("MAX_CONCURRENT_COMPETITOR_REQUESTS", "4")),
+        max_waiting=8,
+        max_queue_wait=5.0,
+        providers=["serpapi"],
+    ),
+}
+
+def unavailable_response(message: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"error": message},
+        status_code=503,
+        headers={"Retry-After": retry_after_header(retry_after)},
+    )
+
+@app.middleware("http")
+async def shed_load(request: Request, call_next):
+    controller = admission.get(request.url.path)
+    if controller is None:
+        return await call_next(request)
+    try:
+        async with controller.admit():
+            return await call_next(request)
+    except Overloaded as e:
+        return unavailable_response(f"Server is busy, please retry later ({str(e)})", e.retry_after)
+
 # Set up CORS
 origins = [
     "http://localhost",
@@ -44,23 +104,35 @@ async def find_mentors(
     location: str = Query(None, description="Preferred location for mentors")
 ) -> List[Dict[str, Any]]:
     finder = MentorFinder()
-    mentors = await finder.find_potential_mentors(field=business_idea, location=location, min_experience=1)
+    deadline = time.monotonic() + REQUEST_DEADLINE
+    try:
+        mentors = await finder.find_potential_mentors(
+            field=business_idea, location=location, min_experience=1, deadline=deadline
+        )
+    except OutboundUnavailable as e:
+        return unavailable_response(f"Mentor search is unavailable, please retry later ({str(e)})", e.retry_after)
     return mentors
 
+# Plain def so FastAPI runs the blocking SerpAPI/scraping/model calls in its
+# threadpool instead of on the event loop
 @app.get("/findCompetitors")
-async def find_competitors(
+def find_competitors(
     business_idea: str = Query(..., description="The business idea to find competitors for")
 ) -> Dict[str, Any]:
     if not serpapi_key or not gemini_key:
         return {"error": "API keys are not set. Please set the SERPAPI_API_KEY and GEMINI_API_KEY environment variables."}
 
-    analyzer = CompetitorAnalysis(serpapi_key, gemini_key)
+    analyzer = get_analyzer()
+    deadline = time.monotonic() + REQUEST_DEADLINE
 
     # Search for competitors
-    competitors = analyzer.search_competitors(business_idea)
+    try:
+        competitors = analyzer.search_competitors(business_idea, deadline=deadline)
+    except OutboundUnavailable as e:
+        return unavailable_response(f"Competitor search is unavailable, please retry later ({str(e)})", e.retry_after)
     competitors_data = []
     for competitor in competitors:
-        data = analyzer.analyze_competitor(competitor)
+        data = analyzer.analyze_competitor(competitor, deadline=deadline)
         competitors_data.append(data)
 
     # Analyze feasibility using Gemini
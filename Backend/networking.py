@@ -13,10 +13,33 @@ from sentence_transformers import SentenceTransformer
 import os
 from bs4 import BeautifulSoup
 import re
+import httplib2
 from dotenv import load_dotenv
+from ratelimit import (
+    OUTBOUND_TIMEOUT,
+    OutboundUnavailable,
+    RateLimitExceeded,
+    get_throttle,
+    parse_retry_after,
+    throttle_for_url,
+)
+
+# Reasons Google gives for a 403/429 that mean "over quota", as opposed to a
+# misconfigured key or a disabled API.
+QUOTA_REASONS = {
+    "ratelimitexceeded",
+    "userratelimitexceeded",
+    "dailylimitexceeded",
+    "quotaexceeded",
+    "rate_limit_exceeded",
+    "resource_exhausted",
+}
 
 
 class MentorFinder:
+    # The CSE setup hint is only useful once per process, not on every 403
+    _setup_hint_logged = False
+
     def __init__(self):
         """Initialize the MentorFinder with necessary models and API keys."""
         # Load environment variables
@@ -25,6 +48,8 @@ class MentorFinder:
         # Get API keys from environment
         self.google_api_key = os.getenv("GOOGLE_API_KEY")
         self.google_cse_id = os.getenv("GOOGLE_CSE_ID")
+        # Optional override to point Custom Search at a local stand-in
+        self.google_cse_endpoint = os.getenv("GOOGLE_CSE_ENDPOINT")
 
         # Validate API keys
         if not self.google_api_key:
@@ -54,9 +79,19 @@ class MentorFinder:
         return logger
 
     async def find_potential_mentors(
-        self, field: str, location: str = None, min_experience: int = 5
+        self,
+        field: str,
+        location: str = None,
+        min_experience: int = 5,
+        deadline: float = None,
     ) -> List[Dict[str, Any]]:
-        """Find potential mentors based on field and criteria."""
+        """
+        Find potential mentors based on field and criteria.
+
+        `deadline` is a time.monotonic() value after which no more searches
+        are started. If the search budget runs out after at least one query
+        has been paid for, the mentors found so far are returned.
+        """
         try:
             # Create search queries
             queries = [
@@ -70,9 +105,22 @@ class MentorFinder:
                 queries = [f"{q} {location}" for q in queries]
 
             all_mentors = []
-            async with aiohttp.ClientSession() as session:
+            timeout = aiohttp.ClientTimeout(total=OUTBOUND_TIMEOUT)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                searched = 0
                 for query in queries:
-                    mentors = await self._search_mentors(session, query)
+                    try:
+                        mentors = await self._search_mentors(session, query, deadline)
+                    except OutboundUnavailable as e:
+                        if not searched:
+                            raise
+                        # Keep what we already paid for rather than answering
+                        # 503 and having the client spend the budget again
+                        self.logger.warning(
+                            f"Returning partial results after {searched} searches: {str(e)}"
+                        )
+                        break
+                    searched += 1
                     all_mentors.extend(mentors)
 
             # Remove duplicates and filter
@@ -84,24 +132,42 @@ class MentorFinder:
 
             return ranked_mentors[:10]  # Return top 10 matches
 
+        except OutboundUnavailable:
+            # Let the endpoint answer 503 instead of an empty mentor list
+            raise
+
         except Exception as e:
             self.logger.error(f"Error finding mentors: {str(e)}")
             return []
 
     async def _search_mentors(
-        self, session: aiohttp.ClientSession, query: str
+        self, session: aiohttp.ClientSession, query: str, deadline: float = None
     ) -> List[Dict[str, Any]]:
         """Search for potential mentors using Google Custom Search API."""
         try:
-            service = build("customsearch", "v1", developerKey=self.google_api_key)
+            client_options = (
+                {"api_endpoint": self.google_cse_endpoint}
+                if self.google_cse_endpoint
+                else None
+            )
+            service = build(
+                "customsearch",
+                "v1",
+                developerKey=self.google_api_key,
+                client_options=client_options,
+                http=httplib2.Http(timeout=OUTBOUND_TIMEOUT),
+            )
+            throttle = get_throttle("google_cse")
 
             self.logger.info(f"Searching for: {query}")
 
             try:
-                # Execute the search
-                result = (
-                    service.cse().list(q=query, cx=self.google_cse_id, num=10).execute()
+                # Execute the search off the event loop once the limiter allows it
+                await throttle.acquire_async(deadline)
+                result = await asyncio.to_thread(
+                    service.cse().list(q=query, cx=self.google_cse_id, num=10).execute
                 )
+                throttle.record_success()
 
                 mentors = []
                 for item in result.get("items", []):
@@ -113,30 +179,60 @@ class MentorFinder:
 
                 return mentors
 
+            except OutboundUnavailable:
+                raise
+
             except Exception as api_error:
-                if "403" in str(api_error):
+                resp = getattr(api_error, "resp", None)
+                status = getattr(resp, "status", None)
+                retry_after = resp.get("retry-after") if resp is not None else None
+                if status == 429 or (status == 403 and self._is_quota_error(api_error)):
+                    # Over quota under load: slow down and let the endpoint
+                    # answer 503 rather than an empty mentor list
+                    throttle.record_throttled(parse_retry_after(retry_after))
+                    raise RateLimitExceeded(
+                        throttle.name, "quota exceeded", max(throttle.available_in(), 1.0)
+                    )
+                if status == 403:
+                    throttle.record_failure()
                     self.logger.error(
                         "Google Custom Search API is not properly enabled."
                     )
-                    print("\nTo fix this error:")
-                    print("1. Go to https://console.cloud.google.com/")
-                    print("2. Select your project")
-                    print("3. Go to 'APIs & Services' > 'Library'")
-                    print("4. Search for 'Custom Search API'")
-                    print("5. Click 'Enable'")
-                    print("6. Go to 'APIs & Services' > 'Credentials'")
-                    print("7. Create or use an existing API key")
-                    print("8. Go to https://programmablesearchengine.google.com/")
-                    print("9. Create a new search engine")
-                    print("10. Get your Search Engine ID (cx)")
-                    print("\nThen update your environment variables with the new keys.")
+                    if not MentorFinder._setup_hint_logged:
+                        MentorFinder._setup_hint_logged = True
+                        self.logger.error(
+                            "Enable 'Custom Search API' for your project at "
+                            "https://console.cloud.google.com/, create a search engine at "
+                            "https://programmablesearchengine.google.com/ and set "
+                            "GOOGLE_API_KEY and GOOGLE_CSE_ID accordingly."
+                        )
                     return []
+                throttle.record_status(status, retry_after)
                 raise
 
+        except OutboundUnavailable:
+            raise
+
         except Exception as e:
             self.logger.error(f"Error in mentor search: {str(e)}")
             return []
 
+    def _is_quota_error(self, api_error: Exception) -> bool:
+        """
+        Tell Google's quota 403s apart from configuration 403s by their reason.
+        """
+        try:
+            error = json.loads(api_error.content.decode("utf-8")).get("error", {})
+        except (AttributeError, ValueError, UnicodeDecodeError):
+            return False
+        if not isinstance(error, dict):
+            return False
+        reasons = {str(error.get("status", "")).lower()}
+        for detail in error.get("errors", []) + error.get("details", []):
+            if isinstance(detail, dict):
+                reasons.add(str(detail.get("reason", "")).lower())
+        return bool(reasons & QUOTA_REASONS)
+
     async def _extract_mentor_info(
         self, session: aiohttp.ClientSession, result: Dict
     ) -> Dict[str, Any]:
@@ -195,7 +291,17 @@ class MentorFinder:
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
             }
 
+            # Previews are optional enrichment: skip them rather than queue
+            # inside the request when the LinkedIn budget is used up, and let
+            # the caller fall back to the search snippet
+            throttle = throttle_for_url(profile_url)
+            if not throttle.try_acquire():
+                return {}
+
             async with session.get(profile_url, headers=headers) as response:
+                throttle.record_status(
+                    response.status, response.headers.get("Retry-After")
+                )
                 if response.status != 200:
                     return {}
 
@@ -229,6 +335,11 @@ class MentorFinder:
 
                 return data
 
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            throttle.record_failure()
+            self.logger.error(f"Error scraping LinkedIn preview: {str(e)}")
+            return {}
+
         except Exception as e:
             self.logger.error(f"Error scraping LinkedIn preview: {str(e)}")
             return {}
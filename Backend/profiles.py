@@ -0,0 +1,204 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+# How long a stored profile is served without re-scraping the website.
+PROFILE_MAX_AGE = float(os.getenv("COMPETITOR_PROFILE_MAX_AGE", str(24 * 3600)))
+
+# Most profiles kept at once; the least recently used are evicted first.
+PROFILE_MAX_ENTRIES = int(os.getenv("COMPETITOR_PROFILE_MAX_ENTRIES", "1000"))
+
+# Each profile may be known under a few names (search titles, aliases).
+NAMES_PER_PROFILE = 4
+
+# Profiles this many max_ages old are dropped rather than kept as a fallback.
+EXPIRE_AFTER_MAX_AGES = 7
+
+
+def normalize_name(name: str) -> str:
+    """
+    Reduce a competitor name or search result title to a lookup key.
+
+    Titles are kept whole: the website URL is a profile's identity, and a
+    new name is only linked to an existing profile once it resolves to the
+    same website (see CompetitorProfileStore.alias).
+    """
+    name = re.sub(r"[^a-z0-9]+", " ", name.lower()).strip()
+    return re.sub(r"\s+(app|inc|ltd|llc)$", "", name)
+
+
+def normalize_url(url: str) -> str:
+    """
+    Reduce a website URL to host and path so http/https and www. variants match.
+    """
+    parsed = urlparse(url.strip().lower())
+    host = parsed.hostname or ""
+    if host.startswith("www."):
+        host = host[4:]
+    return f"{host}{parsed.path.rstrip('/')}"
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class CompetitorProfileStore:
+    def __init__(
+        self,
+        max_age: float = PROFILE_MAX_AGE,
+        max_entries: int = PROFILE_MAX_ENTRIES,
+    ):
+        """
+        In-memory store of analyzed competitors, shared across requests.
+
+        Profiles are keyed by normalized website URL and also reachable by
+        normalized name, so "Notion" and "Notion app" resolve to the same
+        entry. At most `max_entries` profiles are kept (LRU), and profiles
+        not refreshed for EXPIRE_AFTER_MAX_AGES * `max_age` are dropped.
+        """
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._by_url: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Name key -> URL key, so evicting a profile orphans its names
+        self._by_name: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Name key -> Event set when the in-flight refresh of that name ends
+        self._refreshing: Dict[str, threading.Event] = {}
+
+    def _lookup(self, url_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Return a copy of a live profile and mark it recently used. Holds no lock.
+        """
+        profile = self._by_url.get(url_key) if url_key else None
+        if profile is None:
+            return None
+        if self._is_expired(profile, time.time()):
+            del self._by_url[url_key]
+            return None
+        self._by_url.move_to_end(url_key)
+        return dict(profile)
+
+    def _is_expired(self, profile: Dict[str, Any], now: float) -> bool:
+        return now - profile["refreshed_at"] > EXPIRE_AFTER_MAX_AGES * self.max_age
+
+    def _link_name(self, name: str, url_key: str) -> None:
+        name_key = normalize_name(name)
+        self._by_name[name_key] = url_key
+        self._by_name.move_to_end(name_key)
+        while len(self._by_name) > self.max_entries * NAMES_PER_PROFILE:
+            self._by_name.popitem(last=False)
+
+    def _evict(self) -> None:
+        now = time.time()
+        for url_key in [k for k, p in self._by_url.items() if self._is_expired(p, now)]:
+            del self._by_url[url_key]
+        while len(self._by_url) > self.max_entries:
+            self._by_url.popitem(last=False)
+        # Drop names whose profile is gone
+        for name_key in [k for k, u in self._by_name.items() if u not in self._by_url]:
+            del self._by_name[name_key]
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the stored profile for a competitor name, if any.
+        """
+        name_key = normalize_name(name)
+        with self._lock:
+            profile = self._lookup(self._by_name.get(name_key))
+            if profile is None:
+                self._by_name.pop(name_key, None)
+            return profile
+
+    def get_by_url(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the stored profile for a website URL, if any.
+        """
+        with self._lock:
+            return self._lookup(normalize_url(url))
+
+    def is_fresh(self, profile: Dict[str, Any]) -> bool:
+        return time.time() - profile["refreshed_at"] < self.max_age
+
+    def put(
+        self,
+        name: str,
+        website: str,
+        content_digest: str,
+        sentiment: Dict[str, float],
+        summary: str,
+    ) -> Dict[str, Any]:
+        """
+        Store a freshly analyzed profile under its name and URL.
+        """
+        profile = {
+            "name": name,
+            "website": website,
+            "content_hash": content_digest,
+            "sentiment": sentiment,
+            "summary": summary,
+            "refreshed_at": time.time(),
+        }
+        url_key = normalize_url(website)
+        with self._lock:
+            stored = self._by_url.get(url_key)
+            if stored:
+                # Keep the name the profile was first stored under
+                profile["name"] = stored["name"]
+            self._by_url[url_key] = profile
+            self._by_url.move_to_end(url_key)
+            self._link_name(name, url_key)
+            self._evict()
+        return dict(profile)
+
+    def alias(self, name: str, profile: Dict[str, Any]) -> None:
+        """
+        Make another name resolve to an existing profile for the same website.
+        """
+        url_key = normalize_url(profile["website"])
+        with self._lock:
+            if url_key in self._by_url:
+                self._link_name(name, url_key)
+
+    def touch(self, profile: Dict[str, Any]) -> None:
+        """
+        Mark a profile as checked now because its content has not changed.
+        """
+        with self._lock:
+            stored = self._by_url.get(normalize_url(profile["website"]))
+            if stored:
+                stored["refreshed_at"] = time.time()
+
+    def claim_refresh(self, name: str) -> Optional[threading.Event]:
+        """
+        Claim the refresh of a competitor so concurrent requests don't repeat it.
+
+        Returns None if the caller now owns the refresh and must call
+        finish_refresh when done, or the Event of the refresh already in
+        flight, which is set once that refresh finishes.
+        """
+        name_key = normalize_name(name)
+        with self._lock:
+            event = self._refreshing.get(name_key)
+            if event is None:
+                self._refreshing[name_key] = threading.Event()
+            return event
+
+    def finish_refresh(self, name: str) -> None:
+        with self._lock:
+            event = self._refreshing.pop(normalize_name(name), None)
+        if event:
+            event.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._by_name.clear()
+            self._by_url.clear()
+
+
+# Shared by every CompetitorAnalysis instance in the process.
+profile_store = CompetitorProfileStore()
@@ -0,0 +1,378 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# (requests per second, burst) for each outbound provider. Override with
+# RATE_LIMIT_<PROVIDER>="<rate>,<burst>", e.g. RATE_LIMIT_SERPAPI="1,3".
+PROVIDER_LIMITS: Dict[str, Tuple[float, int]] = {
+    "google_cse": (1.0, 5),
+    "serpapi": (1.0, 5),
+    "linkedin": (0.5, 2),
+}
+
+# Limit applied to every other host we scrape (competitor websites).
+DEFAULT_HOST_LIMIT: Tuple[float, int] = (1.0, 3)
+
+# Hosts that belong to a named provider rather than getting their own bucket.
+PROVIDER_HOSTS = {
+    "linkedin.com": "linkedin",
+}
+
+# Status codes that mean "slow down" rather than "broken". Scraped sites
+# usually bot-block with 403 under load, and LinkedIn answers 999.
+THROTTLE_STATUSES = {403, 429, 503, 999}
+
+MAX_RETRY_AFTER = 300.0
+
+# Seconds any single outbound call may take. A provider that hangs instead of
+# erroring must still count as a failure, and quickly.
+OUTBOUND_TIMEOUT = float(os.getenv("OUTBOUND_TIMEOUT", "5"))
+
+
+class OutboundUnavailable(Exception):
+    """Raised when an outbound call is refused before it is made."""
+
+    def __init__(self, name: str, message: str, retry_after: float):
+        super().__init__(f"{name}: {message}")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(OutboundUnavailable):
+    """The provider has failed repeatedly and is being skipped."""
+
+
+class RateLimitExceeded(OutboundUnavailable):
+    """Waiting for a slot would take longer than the caller allows."""
+
+
+class Overloaded(Exception):
+    """Raised when an incoming request is shed instead of queued."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given either as seconds or as an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Open after `failure_threshold` consecutive failures and let a single
+        probe through once `reset_timeout` seconds have passed.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def check(self, now: float) -> Optional[float]:
+        """
+        Return None if a call may proceed, otherwise the seconds until retry.
+        """
+        if self.state == "closed":
+            return None
+        remaining = self.opened_at + self.reset_timeout - now
+        if remaining <= 0:
+            # Let one probe through per reset_timeout; everyone else keeps
+            # failing fast until it reports back
+            self.state = "half_open"
+            self.opened_at = now
+            return None
+        return max(remaining, 1.0)
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self, now: float) -> bool:
+        """
+        Count a failure and return True if this opened the circuit.
+        """
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            was_open = self.state == "open"
+            self.state = "open"
+            self.opened_at = now
+            return not was_open
+        return False
+
+
+class Throttle:
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int,
+        min_rate: Optional[float] = None,
+        max_wait: float = 10.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        """
+        Adaptive token bucket plus circuit breaker for one provider or host.
+
+        The bucket is tracked as a theoretical arrival time (GCRA), which
+        behaves like a token bucket of size `burst` refilled at `rate` per
+        second but lets callers reserve a future slot and sleep until it.
+        """
+        self.name = name
+        self.base_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 10
+        self.burst = burst
+        self.max_wait = max_wait
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._tat = 0.0
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, max_wait: Optional[float] = None) -> float:
+        """
+        Reserve the next slot and return how long the caller must wait for it.
+        """
+        if max_wait is None:
+            max_wait = self.max_wait
+        with self._lock:
+            now = time.monotonic()
+            retry_after = self.breaker.check(now)
+            if retry_after is not None:
+                raise CircuitOpenError(self.name, "circuit open", retry_after)
+
+            interval = 1.0 / self.rate
+            start = max(now, self._blocked_until)
+            tat = max(self._tat, start)
+            allowed_at = max(tat - (self.burst - 1) * interval, start)
+            wait = allowed_at - now
+            if wait > max_wait:
+                raise RateLimitExceeded(self.name, "no slot within the allowed wait", wait)
+
+            self._tat = tat + interval
+            return wait
+
+    def _wait_budget(self, deadline: Optional[float]) -> float:
+        """
+        Longest wait allowed, capped by a caller's time.monotonic() deadline.
+        """
+        if deadline is None:
+            return self.max_wait
+        return min(self.max_wait, deadline - time.monotonic())
+
+    def acquire(self, deadline: Optional[float] = None) -> None:
+        """Block until a request to this provider is allowed."""
+        wait = self._reserve(self._wait_budget(deadline))
+        if wait > 0:
+            time.sleep(wait)
+
+    def try_acquire(self) -> bool:
+        """
+        Take a slot only if one is free right now; never waits.
+        """
+        try:
+            self._reserve(max_wait=0.0)
+        except OutboundUnavailable:
+            return False
+        return True
+
+    async def acquire_async(self, deadline: Optional[float] = None) -> None:
+        """Wait without blocking the event loop until a request is allowed."""
+        wait = self._reserve(self._wait_budget(deadline))
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def available_in(self) -> float:
+        """
+        Seconds until the next call would be admitted, without reserving it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.breaker.state == "open":
+                return max(self.breaker.opened_at + self.breaker.reset_timeout - now, 0.0)
+            interval = 1.0 / self.rate
+            start = max(now, self._blocked_until)
+            allowed_at = max(max(self._tat, start) - (self.burst - 1) * interval, start)
+            return allowed_at - now
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.breaker.record_success()
+            # Additive increase back towards the configured rate
+            self.rate = min(self.base_rate, self.rate + self.base_rate / 10)
+
+    def record_throttled(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            now = time.monotonic()
+            # Multiplicative decrease, and honor Retry-After when we got one
+            self.rate = max(self.min_rate, self.rate / 2)
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._blocked_until = max(self._blocked_until, now + pause)
+            opened = self.breaker.record_failure(now)
+        logger.warning(
+            f"{self.name} is throttling us; rate lowered to {self.rate:.2f}/s, "
+            f"pausing {pause:.1f}s"
+        )
+        if opened:
+            logger.error(f"Circuit opened for {self.name} after repeated throttling")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            opened = self.breaker.record_failure(time.monotonic())
+        if opened:
+            logger.error(f"Circuit opened for {self.name} after repeated failures")
+
+    def record_status(self, status: Optional[int], retry_after: Optional[str] = None) -> None:
+        """
+        Update limits from an HTTP status and its raw Retry-After header.
+        """
+        if status in THROTTLE_STATUSES:
+            self.record_throttled(parse_retry_after(retry_after))
+        elif status is None or status >= 500:
+            self.record_failure()
+        elif status < 400:
+            self.record_success()
+        # Other client errors (404, 410, ...) say nothing about the provider's
+        # health, so they neither close the breaker nor raise the rate
+
+
+_throttles: Dict[str, Throttle] = {}
+_registry_lock = threading.Lock()
+
+
+def _limit_for(name: str, default: Tuple[float, int]) -> Tuple[float, int]:
+    override = os.getenv(f"RATE_LIMIT_{name.upper()}")
+    if override:
+        try:
+            rate, burst = override.split(",")
+            return float(rate), int(burst)
+        except ValueError:
+            logger.error(f"Ignoring malformed RATE_LIMIT_{name.upper()}={override!r}")
+    return default
+
+
+def get_throttle(name: str) -> Throttle:
+    """
+    Return the shared throttle for a provider, creating it on first use.
+    """
+    with _registry_lock:
+        throttle = _throttles.get(name)
+        if throttle is None:
+            rate, burst = _limit_for(name, PROVIDER_LIMITS.get(name, DEFAULT_HOST_LIMIT))
+            throttle = Throttle(name, rate, burst)
+            _throttles[name] = throttle
+        return throttle
+
+
+def throttle_for_url(url: str) -> Throttle:
+    """
+    Return the throttle for the host of `url`, or its provider's if it has one.
+    """
+    host = (urlparse(url).hostname or "").lower()
+    for domain, provider in PROVIDER_HOSTS.items():
+        if host == domain or host.endswith(f".{domain}"):
+            return get_throttle(provider)
+    if host.startswith("www."):
+        host = host[4:]
+    return get_throttle(host or "unknown")
+
+
+def provider_retry_after(names: Iterable[str]) -> Optional[float]:
+    """
+    Return the longest wait among the named providers whose circuit is open.
+    """
+    waits = []
+    with _registry_lock:
+        throttles = [_throttles[name] for name in names if name in _throttles]
+    for throttle in throttles:
+        if throttle.breaker.state == "open":
+            wait = throttle.available_in()
+            # Once the reset timeout has passed the next call is the probe
+            if wait > 0:
+                waits.append(wait)
+    return max(waits) if waits else None
+
+
+def retry_after_header(seconds: float) -> str:
+    """Format a wait as a Retry-After header value in whole seconds."""
+    return str(max(1, math.ceil(seconds)))
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_waiting: int,
+        max_queue_wait: float,
+        providers: Iterable[str] = (),
+    ):
+        """
+        Bound how many requests an endpoint runs and queues at once.
+
+        Requests beyond `max_waiting` queued callers, or that wait longer than
+        `max_queue_wait` seconds, are shed with Overloaded so latency stays
+        bounded. Requests are also shed while any of `providers` is down.
+        """
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.max_queue_wait = max_queue_wait
+        self.providers = list(providers)
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    @asynccontextmanager
+    async def admit(self):
+        retry_after = provider_retry_after(self.providers)
+        if retry_after is not None:
+            raise Overloaded(f"{self.name}: upstream provider unavailable", retry_after)
+
+        if not self._semaphore.locked():
+            # A free slot is taken immediately without yielding
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_waiting:
+            raise Overloaded(f"{self.name}: too many queued requests", self.max_queue_wait)
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.max_queue_wait)
+            except asyncio.TimeoutError:
+                raise Overloaded(f"{self.name}: timed out waiting for a slot", self.max_queue_wait)
+            finally:
+                self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()